@@ -3,7 +3,7 @@ XML to Excel Converter - Streamlit App
 Save this as: app.py
 
 To run locally (if you have Python):
-  pip install streamlit openpyxl
+  pip install streamlit lxml
   streamlit run app.py
 
 To deploy to Streamlit Cloud (NO installation needed):
@@ -11,21 +11,117 @@ To deploy to Streamlit Cloud (NO installation needed):
 """
 
 import streamlit as st
-import xml.etree.ElementTree as ET
-import openpyxl
-from openpyxl.styles import Font, PatternFill
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+# lxml parses much faster; the standard library is kept as a fallback
+try:
+    from lxml import etree as ET
+    HAVE_LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    HAVE_LXML = False
 import io
+import operator
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
+from types import SimpleNamespace
 
-# Page configuration
-st.set_page_config(
-    page_title="XML to Excel Converter",
-    page_icon="📊",
-    layout="centered"
+# XML tag -> Excel column header, in output column order
+TAG_TO_HEADER = (
+    ('TransType', 'Transaction Type'),
+    ('Date', 'Date'),
+    ('Time', 'Time'),
+    # Patron information
+    ('PatronType', 'Patron Type'),
+    ('PatronGradeLevel', 'Grade Level'),
+    # Material information
+    ('Title', 'Title'),
+    ('ISBN', 'ISBN'),
+    ('BibType', 'Material Type'),
+    ('PubYear', 'Publication Year'),
+    ('CopyBarcode', 'Copy Barcode'),
+    ('CallNumber', 'Call Number'),
+    ('CircType', 'Circulation Type'),
 )
+TAGS = tuple(tag for tag, _ in TAG_TO_HEADER)
+HEADERS = tuple(header for _, header in TAG_TO_HEADER)
 
-# Custom CSS for better styling
-st.markdown("""
+# Every field pre-seeded to '' so missing tags stay empty, read back in one C call
+EMPTY_FIELDS = dict.fromkeys(TAGS, '')
+ROW_GETTER = operator.itemgetter(*TAGS)
+
+# Fixed parts of the xlsx package. The workbook is a single sheet of inline
+# strings, so it is written directly rather than through a spreadsheet library.
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+XLSX_PARTS = (
+    ('[Content_Types].xml', XML_DECLARATION +
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'),
+    ('_rels/.rels', XML_DECLARATION +
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'),
+    ('xl/workbook.xml', XML_DECLARATION +
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Transactions" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'),
+    ('xl/_rels/workbook.xml.rels', XML_DECLARATION +
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+        '</Relationships>'),
+    # Style 1 is the header: bold white text on a blue fill
+    ('xl/styles.xml', XML_DECLARATION +
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="2">'
+        '<font><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+        '<font><b/><sz val="11"/><color rgb="FFFFFFFF"/><name val="Calibri"/><family val="2"/></font>'
+        '</fonts>'
+        '<fills count="3">'
+        '<fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill>'
+        '<fill><patternFill patternType="solid"><fgColor rgb="FF4472C4"/><bgColor rgb="FF4472C4"/></patternFill></fill>'
+        '</fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2">'
+        '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="0" fontId="1" fillId="2" borderId="0" xfId="0" applyFont="1" applyFill="1"/>'
+        '</cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'),
+)
+
+SHEET_PATH = 'xl/worksheets/sheet1.xml'
+SHEET_HEAD = XML_DECLARATION + '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+SHEET_TAIL = '</sheetData></worksheet>'
+CELL_START = '<c t="inlineStr"><is><t xml:space="preserve">'
+HEADER_CELL_START = '<c s="1" t="inlineStr"><is><t xml:space="preserve">'
+CELL_END = '</t></is></c>'
+
+# How often (in transactions) the worker publishes its progress to the page
+PROGRESS_EVERY = 1000
+
+# Converted workbooks kept in memory across sessions, and for how long (seconds)
+CACHE_MAX_ENTRIES = 8
+CACHE_TTL = 3600
+
+# Deflate level for "fast save": much less CPU than the default 6, slightly larger file
+FAST_SAVE_COMPRESSLEVEL = 1
+
+# Static page markup. Streamlit drops any element a rerun does not emit again,
+# so these are still sent on every rerun; they are just built in one place.
+CSS = """
     <style>
     .main {
         padding-top: 2rem;
@@ -57,99 +153,164 @@ st.markdown("""
         margin: 1rem 0;
     }
     </style>
-""", unsafe_allow_html=True)
-
-def parse_xml_to_excel(xml_file):
-    """Parse XML file and create Excel output"""
-    try:
-        # Parse XML content
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-        
-        data_rows = []
-        
-        # Extract data from XML - all fields from your structure
-        for transaction in root.findall('Transaction'):
-            transType = transaction.find('TransType').text if transaction.find('TransType') is not None else ''
-            date = transaction.find('Date').text if transaction.find('Date') is not None else ''
-            time = transaction.find('Time').text if transaction.find('Time') is not None else ''
-            
-            # Patron information
-            patronType = transaction.find('PatronType').text if transaction.find('PatronType') is not None else ''
-            patronGradeLevel = transaction.find('PatronGradeLevel').text if transaction.find('PatronGradeLevel') is not None else ''
-            
-            # Material information
-            title = transaction.find('Title').text if transaction.find('Title') is not None else ''
-            isbn = transaction.find('ISBN').text if transaction.find('ISBN') is not None else ''
-            bibType = transaction.find('BibType').text if transaction.find('BibType') is not None else ''
-            pubYear = transaction.find('PubYear').text if transaction.find('PubYear') is not None else ''
-            copyBarcode = transaction.find('CopyBarcode').text if transaction.find('CopyBarcode') is not None else ''
-            callNumber = transaction.find('CallNumber').text if transaction.find('CallNumber') is not None else ''
-            circType = transaction.find('CircType').text if transaction.find('CircType') is not None else ''
+"""
+
+INFO_BOX_HTML = """
+        <div class="info-box">
+            <strong>📋 How to use:</strong><br>
+            1. Upload your XML file below<br>
+            2. Click "Convert to Excel"<br>
+            3. Download your formatted Excel file
+        </div>
+    """
+
+FOOTER_HTML = """
+        <div style="text-align: center; color: #666; font-size: 0.9rem;">
+            Upload an XML file to extract transaction data and download as Excel
+        </div>
+    """
+
+# Page configuration
+st.set_page_config(
+    page_title="XML to Excel Converter",
+    page_icon="📊",
+    layout="centered"
+)
 
+# Custom CSS for better styling
+st.markdown(CSS, unsafe_allow_html=True)
+
+def iter_transactions(xml_file):
+    """Yield each Transaction directly under the root, dropping it once the caller is done with it"""
+    if HAVE_LXML:
+        # lxml filters on the tag in C, so only Transaction elements come back;
+        # internal DTD entities are expanded (as ElementTree does), external ones never are
+        context = ET.iterparse(xml_file, events=('end',), tag='Transaction', resolve_entities='internal')
+        for _, transaction in context:
+            # Like root.findall('Transaction'), skip nested Transaction elements
+            parent = transaction.getparent()
+            if parent is None or parent.getparent() is not None:
+                continue
             
-            data_rows.append({
-                'Transaction Type': transType,
-                'Date': date,
-                'Time': time,
-                'Patron Type': patronType,
-                'Grade Level': patronGradeLevel,
-                'Title': title,
-                'ISBN': isbn,
-                'Material Type': bibType,
-                'Publication Year': pubYear,
-                'Copy Barcode': copyBarcode,
-                'Call Number': callNumber,
-                'Circulation Type': circType,
-            })
-        
-        if not data_rows:
-            return None, "No transaction data found in XML file", 0
+            yield transaction
+            
+            # Drop the processed transaction and its earlier siblings
+            transaction.clear()
+            while transaction.getprevious() is not None:
+                del parent[0]
+        return
+    
+    # Stream the XML instead of building the whole tree in memory
+    context = ET.iterparse(xml_file, events=('start', 'end'))
+    _, root = next(context)
+    
+    # Track depth so only direct children of the root count, as with findall()
+    depth = 1
+    for event, transaction in context:
+        if event == 'start':
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 1 or transaction.tag != 'Transaction':
+            continue
         
-        # Create Excel workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Transactions"
+        yield transaction
         
+        # Drop the processed transaction so memory stays flat
+        transaction.clear()
+        root.clear()
+
+def iter_transaction_rows(xml_file):
+    """Yield one tuple of field values per Transaction, in HEADERS order"""
+    # Extract data from XML - all fields from your structure
+    for transaction in iter_transactions(xml_file):
+        # Single pass over the children instead of a find() per field; walking
+        # them in reverse lets the first occurrence of a tag win, as find() did
+        fields = EMPTY_FIELDS.copy()
+        for child in reversed(transaction):
+            fields[child.tag] = child.text or ''
+        yield ROW_GETTER(fields)
+
+def sheet_row(row_num, values, cell_start=CELL_START):
+    """Build the <row> XML for one sheet row of inline strings"""
+    # Escaping is inlined: chained str.replace beats both saxutils.escape (an
+    # extra call per value) and str.translate (slow with multi-char mappings).
+    # A raw \r would be normalised to \n on read, so it goes out as &#13;
+    cells = ''.join(
+        cell_start
+        + value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('\r', '&#13;')
+        + CELL_END
+        if value else '<c/>'
+        for value in values
+    )
+    return f'<row r="{row_num}">{cells}</row>'
+
+def parse_xml_to_excel(xml_file, fast_save=False, progress=None):
+    """Parse XML file and create Excel output, updating progress.rows as it goes
+
+    Returns (excel_buffer, num_rows), or (None, 0) when the file has no
+    transactions. Parse and I/O errors are raised for the caller to report.
+    """
+    # Rows are spooled to disk: <cols> has to come before <sheetData>, and
+    # the column widths are not known until every row has been seen
+    with tempfile.TemporaryFile() as sheet_data:
         # Add headers with styling
-        headers = ['Transaction Type', 'Date', 'Time', 'Patron Type', 'Grade Level',
-                   'Title', 'ISBN', 'Material Type', 'Publication Year', 'Copy Barcode', 
-                   'Call Number', 'Circulation Type']
+        sheet_data.write(sheet_row(1, HEADERS, HEADER_CELL_START).encode())
         
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=header)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+        # Add data rows straight from the XML, tracking column widths as we go
+        max_len = [len(header) for header in HEADERS]
+        num_rows = 0
+        for num_rows, row in enumerate(iter_transaction_rows(xml_file), 1):
+            sheet_data.write(sheet_row(num_rows + 1, row).encode())
+            if progress is not None and not num_rows % PROGRESS_EVERY:
+                progress.rows = num_rows
+            for i, value in enumerate(row):
+                if len(value) > max_len[i]:
+                    max_len[i] = len(value)
         
-        # Add data rows
-        for row_num, data in enumerate(data_rows, 2):
-            for col_num, header in enumerate(headers, 1):
-                ws.cell(row=row_num, column=col_num, value=data[header])
+        if not num_rows:
+            return None, 0
         
         # Auto-adjust column widths
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(cell.value)
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
+        cols = ''.join(
+            f'<col min="{col_num}" max="{col_num}" width="{min(length + 2, 50)}" customWidth="1"/>'
+            for col_num, length in enumerate(max_len, 1)
+        )
         
-        # Save to bytes buffer
+        # Assemble the xlsx package in a bytes buffer
         excel_buffer = io.BytesIO()
-        wb.save(excel_buffer)
-        excel_buffer.seek(0)
-        
-        return excel_buffer, "Success", len(data_rows)
-        
-    except ET.ParseError as e:
-        return None, f"Invalid XML file: {str(e)}", 0
-    except Exception as e:
-        return None, f"Error processing file: {str(e)}", 0
+        compresslevel = FAST_SAVE_COMPRESSLEVEL if fast_save else None
+        with zipfile.ZipFile(excel_buffer, 'w', zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as zf:
+            for name, data in XLSX_PARTS:
+                zf.writestr(name, data)
+            # The sheet's exact size is known up front, so zipfile only
+            # switches to Zip64 headers when the sheet actually needs them
+            sheet_head = f'{SHEET_HEAD}<cols>{cols}</cols><sheetData>'.encode()
+            sheet_tail = SHEET_TAIL.encode()
+            sheet_info = zipfile.ZipInfo(SHEET_PATH, date_time=time.localtime()[:6])
+            sheet_info.compress_type = zf.compression
+            sheet_info._compresslevel = zf.compresslevel  # no public setter before 3.13
+            sheet_info.external_attr = 0o600 << 16
+            sheet_info.file_size = len(sheet_head) + sheet_data.tell() + len(sheet_tail)
+            with zf.open(sheet_info, 'w') as sheet:
+                sheet.write(sheet_head)
+                sheet_data.seek(0)
+                shutil.copyfileobj(sheet_data, sheet, 1 << 20)
+                sheet.write(sheet_tail)
+    
+    excel_buffer.seek(0)
+    
+    return excel_buffer, num_rows
+
+# Bounded, since the cache is shared by every session on the server. Errors
+# propagate instead of being returned, so a failed conversion is never cached.
+@st.cache_data(show_spinner=False, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def convert_xml_bytes(xml_bytes, fast_save=False, _progress=None):
+    """Convert raw XML bytes to xlsx bytes, cached on the file contents"""
+    # The leading underscore keeps the progress tracker out of the cache key
+    excel_buffer, num_transactions = parse_xml_to_excel(io.BytesIO(xml_bytes), fast_save, _progress)
+    excel_bytes = excel_buffer.getvalue() if excel_buffer else None
+    return excel_bytes, num_transactions
 
 # Main app
 def main():
@@ -158,14 +319,7 @@ def main():
     st.markdown("Convert your transaction XML files to formatted Excel spreadsheets")
     
     # Info box
-    st.markdown("""
-        <div class="info-box">
-            <strong>📋 How to use:</strong><br>
-            1. Upload your XML file below<br>
-            2. Click "Convert to Excel"<br>
-            3. Download your formatted Excel file
-        </div>
-    """, unsafe_allow_html=True)
+    st.markdown(INFO_BOX_HTML, unsafe_allow_html=True)
     
     # File uploader
     uploaded_file = st.file_uploader(
@@ -179,47 +333,76 @@ def main():
         st.write(f"**File:** {uploaded_file.name}")
         st.write(f"**Size:** {uploaded_file.size / 1024:.2f} KB")
         
+        # Trade a slightly larger file for a quicker save
+        fast_save = st.checkbox(
+            "⚡ Fast save",
+            help="Compress the Excel file less for a faster conversion (the file will be a bit larger)"
+        )
+        
         # Convert button
         if st.button("🔄 Convert to Excel", type="primary"):
-            with st.spinner("Processing your file..."):
-                # Process the file
-                excel_buffer, message, num_transactions = parse_xml_to_excel(uploaded_file)
+            # Convert in a worker thread so the page can report progress meanwhile
+            progress = SimpleNamespace(rows=0)
+            with st.status("Processing your file...") as status:
+                with ThreadPoolExecutor(
+                    max_workers=1,
+                    initializer=add_script_run_ctx,
+                    initargs=(None, get_script_run_ctx())
+                ) as executor:
+                    # Process the file (re-runs on the same upload hit the cache)
+                    future = executor.submit(convert_xml_bytes, uploaded_file.getvalue(), fast_save, progress)
+                    # Only send an update to the browser when the count has moved
+                    shown_rows = 0
+                    while not future.done():
+                        if progress.rows != shown_rows:
+                            shown_rows = progress.rows
+                            status.update(label=f"Processing your file... {shown_rows:,} transactions so far")
+                        wait([future], timeout=0.1)
                 
-                if excel_buffer:
-                    # Success!
-                    st.markdown(f"""
-                        <div class="success-box">
-                            <strong>✅ Success!</strong><br>
-                            Processed {num_transactions} transactions
-                        </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # Generate download filename
-                    original_name = uploaded_file.name.rsplit('.', 1)[0]
-                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                    download_name = f"{original_name}_transactions_{timestamp}.xlsx"
-                    
-                    # Download button
-                    st.download_button(
-                        label="📥 Download Excel File",
-                        data=excel_buffer,
-                        file_name=download_name,
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        type="primary"
-                    )
-                    
-                    st.balloons()
+                try:
+                    excel_bytes, num_transactions = future.result()
+                    message = "No transaction data found in XML file"
+                except ET.ParseError as e:
+                    excel_bytes, message = None, f"Invalid XML file: {str(e)}"
+                except Exception as e:
+                    excel_bytes, message = None, f"Error processing file: {str(e)}"
+                
+                if excel_bytes:
+                    status.update(label=f"Processed {num_transactions:,} transactions", state="complete")
                 else:
-                    # Error
-                    st.error(f"❌ {message}")
+                    status.update(label="Conversion failed", state="error")
+            
+            if excel_bytes:
+                # Success!
+                st.markdown(f"""
+                    <div class="success-box">
+                        <strong>✅ Success!</strong><br>
+                        Processed {num_transactions} transactions
+                    </div>
+                """, unsafe_allow_html=True)
+                
+                # Generate download filename
+                original_name = uploaded_file.name.rsplit('.', 1)[0]
+                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                download_name = f"{original_name}_transactions_{timestamp}.xlsx"
+                
+                # Download button
+                st.download_button(
+                    label="📥 Download Excel File",
+                    data=io.BytesIO(excel_bytes),
+                    file_name=download_name,
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    type="primary"
+                )
+                
+                st.balloons()
+            else:
+                # Error
+                st.error(f"❌ {message}")
     
     # Footer
     st.markdown("---")
-    st.markdown("""
-        <div style="text-align: center; color: #666; font-size: 0.9rem;">
-            Upload an XML file to extract transaction data and download as Excel
-        </div>
-    """, unsafe_allow_html=True)
+    st.markdown(FOOTER_HTML, unsafe_allow_html=True)
 
 if __name__ == "__main__":
     main()